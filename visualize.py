@@ -25,25 +25,111 @@
 This script helps analyze memory leaks. It plots a graph for each tag.
 """
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import argparse
 import glob
-import dateutil
+import hashlib
+import importlib.util
+import os
+import tempfile
+import concurrent.futures
 import codecs
+from pandas.api.types import is_integer_dtype, is_datetime64_any_dtype
 from matplotlib.ticker import FormatStrFormatter
 import seaborn as sns
 
+# These are passed to pandas' groupby(...).agg(engine='numba') when
+# PoolEntries.USE_NUMBA is set. They live at module scope so that pandas
+# compiles them once per process instead of compiling a fresh closure on
+# every call. pandas imports numba itself, only when they are used.
+
+def _first_nonzero(values, index):
+    for v in values:
+        if v != 0:
+            return v
+    return 0.0
+
+def _last_nonzero(values, index):
+    for i in range(len(values) - 1, -1, -1):
+        if values[i] != 0:
+            return values[i]
+    return 0.0
+
+# ---------------------------------------------------------------------------
+
+def _lttb_indices(x:np.ndarray, y:np.ndarray, n_out:int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Keeps the first and the last point, splits the rest into n_out - 2
+    buckets and from each bucket keeps the point that forms the largest
+    triangle with the previously kept point and the mean of the next bucket.
+    This keeps the peaks and troughs that a plain stride would drop.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The x values (float), in increasing order.
+    y : np.ndarray
+        The y values (float).
+    n_out : int
+        Number of points to keep.
+
+    Returns
+    -------
+    np.ndarray
+        The indices of the points to keep.
+
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(\
+                (x[a] - avg_x) * (y[start:end] - y[a]) -\
+                (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
 class PoolEntries:
     VALID_COLUMNS = ['TotalUsedBytes', 'PagedDiff', 'NonPagedDiff',\
               'TotalDiff', 'PagedUsedBytes', 'NonPagedUsedBytes']
     VALID_TIME_COLUMNS = ['DateTimeUTC', 'DateTime']
+    VALID_COLUMN_SET = frozenset(VALID_COLUMNS)
+    VALID_TIME_COLUMN_SET = frozenset(VALID_TIME_COLUMNS)
+    # Use numba for the first/last groupby. Off by default: the JIT compile
+    # costs more than the whole Cython groupby unless the process runs many
+    # large queries on a machine with many cores. Requires numba.
+    USE_NUMBA = False
+    # Number of CSV files read at the same time, see add_csv_files()
+    MAX_READ_WORKERS = 4
+    # Tags with more readings than this are downsampled before plotting
+    MAX_PLOT_POINTS = 2000
+    # matplotlib 3.6 renamed the seaborn style to seaborn-v0_8
+    COLOR_SCHEME = 'seaborn' if 'seaborn' in plt.style.available\
+                    else 'seaborn-v0_8'
         
     def __init__(self):
         self.individual_data_frames = list()
         self.pool_entries = None
         self.digest_called = False
+        plt.style.use(PoolEntries.COLOR_SCHEME)
 
     # ------------------------------------------------------------------------
 
@@ -63,20 +149,50 @@ class PoolEntries:
 
         """
         with open(filename, mode="rb") as f:
-            fbytes = f.read(64)
-            BOMS = (
-                (codecs.BOM_UTF8, "utf-8"),
-                (codecs.BOM_UTF16, "utf-16"),
-                (codecs.BOM_UTF32_BE, "utf-32be"),
-                (codecs.BOM_UTF32_LE, "utf-32le"),
-                (codecs.BOM_UTF16_BE, "utf-16be"),
-                (codecs.BOM_UTF16_LE, "utf-16le"),
-            )
-            try:
-                return [encoding for bom, encoding in BOMS \
-                        if fbytes.startswith(bom)][0]
-            except:
-                return "utf-8"
+            head = f.read(4)
+        # The UTF-32 LE BOM starts with the UTF-16 LE BOM, so check it first.
+        # The utf-16/utf-32 codecs consume the BOM and pick the byte order.
+        if head == codecs.BOM_UTF32_LE or head == codecs.BOM_UTF32_BE:
+            return "utf-32"
+        if head.startswith(codecs.BOM_UTF8):
+            return "utf-8"
+        if head.startswith(codecs.BOM_UTF16_LE) or \
+                head.startswith(codecs.BOM_UTF16_BE):
+            return "utf-16"
+        return "utf-8"
+
+    # ------------------------------------------------------------------------
+
+    def read_csv_file(self, csv_file:str) -> pd.DataFrame:
+        """
+        Read a CSV file and parse its timestamps
+
+        Parameters
+        ----------
+        csv_file : str
+            The CSV file to read.
+
+        Returns
+        -------
+        pd.DataFrame
+            The entries in the CSV file.
+
+        """
+        encoding = self.get_encoding(csv_file)
+        try:
+            # pyarrow parses in parallel and understands the ISO timestamps
+            df = pd.read_csv(csv_file, encoding=encoding, engine='pyarrow')
+        except ImportError:
+            df = pd.read_csv(csv_file, encoding=encoding)
+        for col in PoolEntries.VALID_TIME_COLUMNS:
+            if not is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(\
+                    df[col],\
+                    format=('%Y-%m-%dT%H:%M:%S'),\
+                    cache=True)
+        df['TotalDiff'] = \
+            df['PagedDiff'].to_numpy() + df['NonPagedDiff'].to_numpy()
+        return df
 
     # ------------------------------------------------------------------------
 
@@ -95,24 +211,39 @@ class PoolEntries:
             No return.
 
         """
-        df = pd.read_csv(\
-            csv_file,\
-            encoding=self.get_encoding(csv_file),\
-            parse_dates=True,\
-            date_parser=dateutil.parser.parser)
-        df['DateTime'] = pd.to_datetime(\
-            df['DateTime'],\
-            format=('%Y-%m-%dT%H:%M:%S'))
-        df['DateTimeUTC'] = pd.to_datetime(\
-            df['DateTimeUTC'],\
-            format=('%Y-%m-%dT%H:%M:%S'))
-        self.individual_data_frames.append(df)
+        self.individual_data_frames.append(self.read_csv_file(csv_file))
+
+    # ------------------------------------------------------------------------
+
+    def add_csv_files(self, csv_files:list) -> None:
+        """
+        Read several CSV files in parallel and add all their entries to the
+        pool. With pyarrow, each file is already parsed on pyarrow's own
+        thread pool, so only a few files are read at a time; the workers
+        mostly overlap the file I/O and the per-file pandas overhead. The
+        C parser fallback releases the GIL, so threads work for it too.
+
+        Parameters
+        ----------
+        csv_files : list
+            The CSV files to add to the list.
+
+        Returns
+        -------
+        None
+            No return.
+
+        """
+        max_workers = min(PoolEntries.MAX_READ_WORKERS, os.cpu_count() or 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            dfs = list(executor.map(self.read_csv_file, csv_files))
+        self.individual_data_frames.extend(dfs)
 
     # ------------------------------------------------------------------------
 
     def add_totals_row(\
             self, \
-            df:pd.DataFrame) -> pd.DataFrame:
+            df:pd.DataFrame) -> tuple:
         """
         Individual CSV files have all the tags at that moment, and each
         entry forms a tag. But there is no tag for all the tags combined.
@@ -128,18 +259,17 @@ class PoolEntries:
 
         Returns
         -------
-        pd.DataFrame
-            The Dataframe with a total's row added
+        tuple(pd.DataFrame, pd.DataFrame)
+            The input Dataframe and a single row Dataframe with the totals.
+            The caller is expected to concatenate them.
 
         """  
-        column_types = {i:str(df.dtypes[i]) for i in df.columns}
-        total_row_series = df.loc[0].copy()
-        total_row_series["Tag"] = "TOTAL"
-        for colname, coltype in column_types.items():
-            if coltype.startswith('int'):
-                total_row_series[colname] = df[colname].sum()
-        df = df.append(total_row_series, ignore_index=True)
-        return df
+        int_cols = [c for c, d in df.dtypes.items() if is_integer_dtype(d)]
+        totals = {col: df[col].iloc[0] for col in df.columns}
+        totals["Tag"] = "TOTAL"
+        for col in int_cols:
+            totals[col] = int(df[col].sum())
+        return (df, pd.DataFrame([totals], columns=df.columns))
 
     # ------------------------------------------------------------------------
 
@@ -158,20 +288,24 @@ class PoolEntries:
             raise Exception("digest() called again")
         self.digest_called = True
 
-        all_dfs = []
+        all_frames = []
+        totals_frames = []
         for df in self.individual_data_frames:
-            df = self.add_totals_row(df)
-            all_dfs.append(df)
-        self.pool_entries = pd.concat(all_dfs)
+            df, totals_df = self.add_totals_row(df)
+            all_frames.append(df)
+            totals_frames.append(totals_df)
+        # All frames come from the same CSV schema, so there is no need to
+        # sort the columns while aligning them
+        self.pool_entries = pd.concat(\
+            all_frames + totals_frames,\
+            ignore_index=True,\
+            sort=False)
         del(self.individual_data_frames)
         self.individual_data_frames = None
 
         # Sort by timestamp
         # First find the timestamp column name
-        col_types = {i:str(self.pool_entries.dtypes[i]) for i in df.columns}
-        date_col_name = None
-        for colname, coltype in col_types.items():
-            if coltype.startswith('datetime'): date_col_name = colname
+        date_col_name = self.find_date_col_name()
         # Then sort by that column
         self.pool_entries.sort_values(\
             date_col_name,\
@@ -179,8 +313,96 @@ class PoolEntries:
             inplace=True,\
             ignore_index=True)
 
-        self.pool_entries['TotalDiff'] = \
-            self.pool_entries['PagedDiff'] + self.pool_entries['NonPagedDiff']
+        # Tags repeat in every reading, a categorical makes the filters and
+        # the groupbys on them work on integer codes instead of strings
+        self.pool_entries['Tag'] = self.pool_entries['Tag'].astype('category')
+        return self.pool_entries
+
+    # ------------------------------------------------------------------------
+
+    def find_date_col_name(self) -> str:
+        """
+        Find the timestamp column to sort by. This is the last datetime
+        column, i.e. DateTimeUTC, which does not jump around DST.
+
+        Returns
+        -------
+        str
+            The name of the timestamp column.
+
+        """
+        return next(\
+            c for c, d in reversed(list(self.pool_entries.dtypes.items()))\
+            if is_datetime64_any_dtype(d))
+
+    # ------------------------------------------------------------------------
+
+    def save_parquet(self, parquet_file:str) -> bool:
+        """
+        Save the digested dataframe so that later runs can skip parsing
+        the CSV files. The directory is created if needed, and the file is
+        written to a temporary file first and then renamed, so an
+        interrupted run never leaves a truncated file behind.
+
+        Parameters
+        ----------
+        parquet_file : str
+            The file to write.
+
+        Returns
+        -------
+        bool
+            True if the file was written. False if no parquet engine is
+            installed or the file could not be written.
+
+        """
+        if not self.digest_called: self.digest()
+        if importlib.util.find_spec('pyarrow') is None and \
+                importlib.util.find_spec('fastparquet') is None:
+            return False
+        tmp_file = None
+        try:
+            dirname = os.path.dirname(parquet_file)
+            if dirname: os.makedirs(dirname, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(\
+                                dir=dirname or None,\
+                                prefix=os.path.basename(parquet_file) + '.',\
+                                suffix='.tmp')
+            os.close(fd)
+            self.pool_entries.to_parquet(tmp_file)
+            os.replace(tmp_file, parquet_file)
+        except OSError:
+            if tmp_file is not None and os.path.exists(tmp_file):
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+            return False
+        return True
+
+    # ------------------------------------------------------------------------
+
+    def load_parquet(self, parquet_file:str) -> pd.DataFrame:
+        """
+        Load a dataframe saved by save_parquet(). This takes the place of
+        adding the CSV files and calling digest().
+
+        Parameters
+        ----------
+        parquet_file : str
+            The file to read.
+
+        Returns
+        -------
+        pd.DataFrame
+            Returns the DataFrame
+
+        """
+        if self.digest_called:
+            raise Exception("digest() already called")
+        self.pool_entries = pd.read_parquet(parquet_file)
+        self.individual_data_frames = None
+        self.digest_called = True
         return self.pool_entries
 
     # ------------------------------------------------------------------------
@@ -212,7 +434,31 @@ class PoolEntries:
 
         """
         if not self.digest_called: self.digest()
-        return [t for t in self.pool_entries['Tag'].unique()]
+        return self.pool_entries['Tag'].unique().tolist()
+
+    # ------------------------------------------------------------------------
+
+    def without_tags(self, ignore_tags) -> pd.DataFrame:
+        """
+        Get the entries of all tags except TOTAL and the ignored tags.
+        The caller's ignore_tags is not modified.
+
+        Parameters
+        ----------
+        ignore_tags : list or str
+            Tags to leave out, a single tag may be passed as a string.
+            None leaves out only TOTAL.
+
+        Returns
+        -------
+        pd.DataFrame
+            The remaining entries.
+
+        """
+        if isinstance(ignore_tags, str):
+            ignore_tags = [ignore_tags]
+        ignore = pd.Index(['TOTAL', *(ignore_tags or ())])
+        return self.pool_entries[~self.pool_entries['Tag'].isin(ignore)]
 
     # ------------------------------------------------------------------------
 
@@ -220,7 +466,7 @@ class PoolEntries:
             self,\
             n_tags:int,\
             by_col:str="TotalUsedBytes",\
-            ignore_tags:list=[]) -> list:
+            ignore_tags:list=None) -> list:
         """
         Get the list of tags that have the highest usage        
 
@@ -233,23 +479,64 @@ class PoolEntries:
             The default is "TotalUsedBytes".
         ignore_tags : list, optional
             These columns will not be considered for efficiency.
-            The default is [].
+            The default is None.
         Returns
         -------
         List(str)
             List of tags that have the highest usage.
         """
-        if ignore_tags is None or not isinstance(ignore_tags, list):
-            ignore_tags = []
-        ignore_tags.append('TOTAL')
-        reduced_df = \
-            self.pool_entries[~self.pool_entries['Tag'].isin(ignore_tags)]
+        reduced_df = self.without_tags(ignore_tags)
         reduced_df = reduced_df[['Tag', by_col]]
-        top_users = reduced_df.groupby(['Tag'])\
+        top_users = reduced_df.groupby('Tag', sort=False, observed=True)\
+                                [by_col]\
                                 .max()\
-                                .sort_values([by_col], ascending=False)\
-                                .head(n_tags)
-        return [row.name for _ , row in top_users.iterrows()]
+                                .nlargest(n_tags)
+        return top_users.index.tolist()
+
+    # ------------------------------------------------------------------------
+
+    def get_first_last(\
+            self,\
+            reduced_df:pd.DataFrame,\
+            by_col:str) -> pd.DataFrame:
+        """
+        Get the first and the last non-zero entry of a column for every tag.
+        The dataframe must already be sorted by time, which digest() does.
+        If PoolEntries.USE_NUMBA is set, numba is used for the groupby.
+
+        Parameters
+        ----------
+        reduced_df : pd.DataFrame
+            Dataframe with at least the Tag column and by_col.
+        by_col : str
+            The column to look at.
+
+        Returns
+        -------
+        pd.DataFrame
+            Indexed by tag, with the columns 'first' and 'last'. Tags that
+            never have a non-zero entry get 0 for both.
+
+        """
+        if PoolEntries.USE_NUMBA:
+            engine_kwargs = {'nopython':True, 'nogil':True, 'parallel':True}
+            grouped = reduced_df.groupby(\
+                'Tag', sort=False, observed=True)[by_col]
+            return pd.DataFrame({\
+                'first': grouped.agg(\
+                            _first_nonzero,\
+                            engine='numba',\
+                            engine_kwargs=engine_kwargs),\
+                'last': grouped.agg(\
+                            _last_nonzero,\
+                            engine='numba',\
+                            engine_kwargs=engine_kwargs)})
+
+        # first/last skip NaN, so masking the zeros skips them as well
+        values = reduced_df[by_col].where(reduced_df[by_col] != 0)
+        return values.groupby(reduced_df['Tag'], sort=False, observed=True)\
+                    .agg(['first', 'last'])\
+                    .fillna(0.0)
 
     # ------------------------------------------------------------------------
 
@@ -257,7 +544,7 @@ class PoolEntries:
             self,\
             n_tags:int,\
             by_col:str="TotalUsedBytes",\
-            ignore_tags:list=[]) -> list:
+            ignore_tags:list=None) -> list:
         """
         Get the list of tags that see the highest change
         Highest change here is the difference between the first and the
@@ -272,38 +559,22 @@ class PoolEntries:
             The default is "TotalUsedBytes".
         ignore_tags : list, optional
             These columns will not be considered for efficiency.
-            The default is [].
+            The default is None.
         Returns
         -------
         List(str)
             List of tags that have the highest usage.
         """
 
-        def get_change(x):
-            # This reports the percentage change in the tag
-            x = x.to_numpy()
-            x = x[x != 0]
-            try:
-                (first, last) = tuple(x[[0,-1]])
-                return ((last - first)  * 100) / (last + 0.001)
-            except:
-                return 0.0
-
-        if ignore_tags is None or not isinstance(ignore_tags, list):
-            ignore_tags = []
-        ignore_tags.append('TOTAL')
-        
-        reduced_df = \
-            self.pool_entries[~self.pool_entries['Tag'].isin(ignore_tags)]
+        reduced_df = self.without_tags(ignore_tags)
         reduced_df = reduced_df[['Tag', by_col]]
 
-        g = reduced_df[['Tag', by_col]]\
-                .groupby(['Tag'])\
-                .agg(get_change)\
-                .sort_values([by_col], ascending=False)\
-                .head(n_tags)
+        g = self.get_first_last(reduced_df, by_col)
+        # This reports the percentage change in the tag
+        g['diff'] = ((g['last'] - g['first']) * 100) / (g['last'] + 0.001)
+        top = g.nlargest(n_tags, 'diff')
 
-        return [row.name for _ , row in g.iterrows()]
+        return top.index.tolist()
 
     # ------------------------------------------------------------------------
     
@@ -311,7 +582,7 @@ class PoolEntries:
             self,\
             n_tags:int,\
             by_col:str="TotalUsedBytes",\
-            ignore_tags:list=[]) -> list:
+            ignore_tags:list=None) -> list:
         """
         Get the list of tags that see the highest change
         Highest change here is the difference between the first and the
@@ -326,38 +597,21 @@ class PoolEntries:
             The default is "TotalUsedBytes".
         ignore_tags : list, optional
             These columns will not be considered for efficiency.
-            The default is [].
+            The default is None.
         Returns
         -------
         List(str)
             List of tags that have the highest usage.
         """
 
-        def get_change(x):
-            # This reports the percentage change in the tag
-            x = x.to_numpy()
-            x = x[x != 0]
-            try:
-                (first, last) = tuple(x[[0,-1]])
-                return last - first
-            except:
-                return 0.0
-
-        if ignore_tags is None or not isinstance(ignore_tags, list):
-            ignore_tags = []
-        ignore_tags.append('TOTAL')
-        
-        reduced_df = \
-            self.pool_entries[~self.pool_entries['Tag'].isin(ignore_tags)]
+        reduced_df = self.without_tags(ignore_tags)
         reduced_df = reduced_df[['Tag', by_col]]
 
-        g = reduced_df[['Tag', by_col]]\
-                .groupby(['Tag'])\
-                .agg(get_change)\
-                .sort_values([by_col], ascending=False)\
-                .head(n_tags)
+        g = self.get_first_last(reduced_df, by_col)
+        g['diff'] = g['last'] - g['first']
+        top = g.nlargest(n_tags, 'diff')
 
-        return [row.name for _ , row in g.iterrows()]
+        return top.index.tolist()
 
     # ------------------------------------------------------------------------
     
@@ -365,7 +619,7 @@ class PoolEntries:
             self,\
             n_tags:int,\
             by_col:str="TotalUsedBytes",\
-            ignore_tags:list=[]) -> list:
+            ignore_tags:list=None) -> list:
         """
         Get N tags with the highest average usage across the timeframe.
 
@@ -378,7 +632,7 @@ class PoolEntries:
             The default is "TotalUsedBytes".. The default is "TotalUsedBytes".
         ignore_tags : list, optional
             These columns will not be considered for efficiency.
-            The default is [].
+            The default is None.
 
         Returns
         -------
@@ -387,22 +641,62 @@ class PoolEntries:
 
         """
         
-        if ignore_tags is None or not isinstance(ignore_tags, list):
-            ignore_tags = []
-        ignore_tags.append('TOTAL')
-        
-        reduced_df = \
-            self.pool_entries[~self.pool_entries['Tag'].isin(ignore_tags)]
+        reduced_df = self.without_tags(ignore_tags)
         reduced_df = reduced_df[['Tag', by_col]]
 
         g = reduced_df[['Tag', by_col]]\
-                .groupby(['Tag'])\
+                .groupby('Tag', sort=False, observed=True)\
                 .mean()\
                 .sort_values([by_col], ascending=False)\
                 .head(n_tags)
 
-        return [row.name for _ , row in g.iterrows()]
+        return g.index.tolist()
     
+    # ------------------------------------------------------------------------
+
+    def downsample(\
+            self,\
+            reduced_df:pd.DataFrame,\
+            by_col:str,\
+            timestamp_tag:str,\
+            n_points:int=None) -> pd.DataFrame:
+        """
+        Reduce the number of readings per tag so that long captures can be
+        plotted. Uses LTTB so the shape of the curve is preserved.
+
+        Parameters
+        ----------
+        reduced_df : pd.DataFrame
+            Dataframe with the Tag, by_col and timestamp_tag columns.
+        by_col : str
+            The column that is plotted.
+        timestamp_tag : str
+            The timestamp column that is plotted.
+        n_points : int, optional
+            Maximum readings per tag.
+            The default is PoolEntries.MAX_PLOT_POINTS.
+
+        Returns
+        -------
+        pd.DataFrame
+            The dataframe with at most n_points readings per tag.
+
+        """
+        if n_points is None: n_points = PoolEntries.MAX_PLOT_POINTS
+        parts = []
+        downsampled = False
+        for _, g in reduced_df.groupby('Tag', sort=False, observed=True):
+            if len(g) > n_points:
+                x = g[timestamp_tag].to_numpy().astype(np.int64)
+                x = (x - x[0]).astype(np.float64)
+                y = g[by_col].to_numpy(dtype=np.float64)
+                g = g.iloc[_lttb_indices(x, y, n_points)]
+                downsampled = True
+            parts.append(g)
+        if not downsampled:
+            return reduced_df
+        return pd.concat(parts)
+
     # ------------------------------------------------------------------------
     def show_plot(\
             self,\
@@ -446,22 +740,23 @@ class PoolEntries:
             DESCRIPTION.
 
         """
-        if timestamp_tag not in PoolEntries.VALID_TIME_COLUMNS:
+        if timestamp_tag not in PoolEntries.VALID_TIME_COLUMN_SET:
             raise Exception('Invalid timestamp tag')
 
-        if by_col not in PoolEntries.VALID_COLUMNS:
+        if by_col not in PoolEntries.VALID_COLUMN_SET:
             raise Exception('Invalid column name')
 
         if None is not rcparams: plt.rcParams.update(rcparams)
 
         title = by_col
-        reduced_df = self.pool_entries[self.pool_entries['Tag'].isin(tags)]
-        reduced_df = reduced_df[['Tag', by_col, timestamp_tag]]
+        reduced_df = self.pool_entries.loc[\
+                        self.pool_entries['Tag'].isin(tags),\
+                        ['Tag', by_col, timestamp_tag]]
         yformatter = FormatStrFormatter('%d')
 
         if by_col.endswith('Bytes'):
-            reduced_df = reduced_df.copy()
-            reduced_df[[by_col]] = reduced_df[[by_col]].divide(1024 * 1024)
+            reduced_df = reduced_df.assign(\
+                **{by_col: reduced_df[by_col] * (1.0 / (1024 * 1024))})
             title = f"{by_col} (MB)"
             yformatter = FormatStrFormatter('%.3f')
         else:
@@ -469,18 +764,19 @@ class PoolEntries:
 
         n_readings = reduced_df[timestamp_tag].unique().shape[0]
         marker = '.' if n_readings < 50 else None
-        ax = reduced_df.pivot(\
-                        index=timestamp_tag,\
-                        values=by_col,\
-                        columns='Tag').plot(marker=marker)
+        plot_df = self.downsample(reduced_df, by_col, timestamp_tag)
+        # Plot tag by tag, a pivot would build a dense timestamps x tags
+        # frame that is mostly NaN once the tags are downsampled
+        fig, ax = plt.subplots()
+        for tag, g in plot_df.groupby('Tag', sort=False, observed=True):
+            ax.plot(g[timestamp_tag], g[by_col], marker=marker, label=tag)
+        ax.legend(title='Tag')
+        ax.set_xlabel(timestamp_tag)
+        fig.autofmt_xdate()
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M:%S'))
         ax.yaxis.set_major_formatter(yformatter)
         ax.set_title(title)
 
-        colorScheme = 'seaborn'
-        plt.style.use([colorScheme])
-        plt.style.context(colorScheme)
-
         if show_correlation:
             fig = plt.figure(f"Correlation Between Selected Tags: {title}")
             fig.suptitle(f"Correlation Between Selected Tags: {title}")
@@ -582,10 +878,10 @@ class PoolEntries:
 
         """
 
-        if timestamp_tag not in PoolEntries.VALID_TIME_COLUMNS:
+        if timestamp_tag not in PoolEntries.VALID_TIME_COLUMN_SET:
             raise Exception('Invalid timestamp tag')
 
-        if by_col not in PoolEntries.VALID_COLUMNS:
+        if by_col not in PoolEntries.VALID_COLUMN_SET:
             raise Exception('Invalid column name')
 
         if None is include_tags or not isinstance(include_tags, list):
@@ -642,6 +938,77 @@ class PoolEntries:
 # ---------------------------------------------------------------------------
 
 
+# Bump this whenever digest() changes what it produces, so that cache files
+# written by older versions are not used
+CACHE_FORMAT_VERSION = 1
+# Only files with this prefix are ever removed from the cache directory
+CACHE_FILE_PREFIX = "poolmon-"
+
+def get_cache_file(dirname:str, csv_files:list) -> str:
+    """
+    Get the name of the parquet file that caches the digested CSV files.
+    The name depends on the names and modification times of the files, so
+    adding, removing or changing a CSV file results in a new cache file.
+    So does a change of CACHE_FORMAT_VERSION.
+
+    Parameters
+    ----------
+    dirname : str
+        Directory where all the csv files are.
+    csv_files : list
+        The CSV files.
+
+    Returns
+    -------
+    str
+        Path of the cache file, inside the "cache" subdirectory of dirname,
+        named poolmon-<key>.parquet.
+
+    """
+    key = hashlib.sha1(\
+            repr((CACHE_FORMAT_VERSION,\
+                  sorted((f, os.path.getmtime(f)) for f in csv_files)))\
+            .encode()).hexdigest()
+    return os.path.join(dirname, "cache", f"{CACHE_FILE_PREFIX}{key}.parquet")
+
+# ---------------------------------------------------------------------------
+
+def remove_stale_cache_files(cache_file:str) -> None:
+    """
+    Remove all cache files other than cache_file from its directory,
+    including temporary files left behind by interrupted runs. Only files
+    named like the ones get_cache_file() and save_parquet() create are
+    touched, anything else in the directory is left alone. The CSV
+    files keep changing while a capture is running, so otherwise every
+    run would leave another cache file behind.
+
+    Parameters
+    ----------
+    cache_file : str
+        The cache file to keep.
+
+    Returns
+    -------
+    None
+        No return.
+
+    """
+    cache_dir = os.path.dirname(cache_file)
+    stale_files = []
+    for pattern in ("*.parquet", "*.parquet.*.tmp"):
+        stale_files += glob.glob(\
+                        os.path.join(cache_dir, CACHE_FILE_PREFIX + pattern))
+    for fname in stale_files:
+        if os.path.abspath(fname) == os.path.abspath(cache_file):
+            continue
+        try:
+            os.remove(fname)
+        except OSError:
+            pass
+
+# ---------------------------------------------------------------------------
+
+
 def plot_files_in_directory(\
         dirname:str=".",\
         by_col:str=PoolEntries.VALID_COLUMNS[0],\
@@ -695,9 +1062,20 @@ def plot_files_in_directory(\
 
     """
     pe = PoolEntries()
-    for fname in glob.glob(f"{dirname}/*pool.csv"):
-        pe.add_csv_file(fname)
-    pe.digest()
+    csv_files = glob.glob(f"{dirname}/*pool.csv")
+    cache_file = get_cache_file(dirname, csv_files)
+    # The cache is only an optimization, if it can't be read or written
+    # just parse the CSV files
+    if os.path.exists(cache_file):
+        try:
+            pe.load_parquet(cache_file)
+        except Exception:
+            pe = PoolEntries()
+    if not pe.digest_called:
+        pe.add_csv_files(csv_files)
+        pe.digest()
+        if pe.save_parquet(cache_file):
+            remove_stale_cache_files(cache_file)
     pe.do_plot(\
         by_col=by_col,\
         timestamp_tag=time_col,\